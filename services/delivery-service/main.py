@@ -2,12 +2,13 @@ import asyncio
 import logging
 import os
 import random
-import time
-import uuid
 from contextlib import asynccontextmanager
 
 import httpx
+import orjson
+from cachetools import LRUCache
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from opentelemetry import metrics, trace
 from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
@@ -18,20 +19,37 @@ from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBasedTraceIdRatio
 from prometheus_fastapi_instrumentator import Instrumentator
-from pythonjsonlogger import jsonlogger
 
 from consumer import start_consumer
 
 # ─── Logging ──────────────────────────────────────────────────────────────────
+# Attributes every LogRecord has; anything else on a record came from `extra=`.
+_LOG_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (timestamp, level, name, message + extras), encoded with orjson."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _LOG_RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
 logger = logging.getLogger("delivery-service")
 handler = logging.StreamHandler()
-handler.setFormatter(
-    jsonlogger.JsonFormatter(
-        fmt="%(asctime)s %(levelname)s %(name)s %(message)s",
-        rename_fields={"asctime": "timestamp", "levelname": "level"},
-    )
-)
+handler.setFormatter(JsonFormatter())
 logger.addHandler(handler)
 logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
@@ -40,8 +58,21 @@ OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4317"
 SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "delivery-service")
 resource = Resource.create({"service.name": SERVICE_NAME})
 
-tracer_provider = TracerProvider(resource=resource)
-tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=OTLP_ENDPOINT, insecure=True)))
+# Head sampling: new traces are kept at OTEL_SAMPLER_RATIO, while spans with a
+# remote parent follow the parent's sampled flag so traces stay complete.
+sampler = ParentBasedTraceIdRatio(float(os.getenv("OTEL_SAMPLER_RATIO", "0.1")))
+tracer_provider = TracerProvider(resource=resource, sampler=sampler)
+# Spans are only buffered on the hot path; export happens in 512-span batches
+# every 5s, which keeps gRPC round-trips low at the consumer's span rate.
+tracer_provider.add_span_processor(
+    BatchSpanProcessor(
+        OTLPSpanExporter(endpoint=OTLP_ENDPOINT, insecure=True),
+        max_queue_size=2048,
+        max_export_batch_size=512,
+        schedule_delay_millis=5000,
+        export_timeout_millis=30000,
+    )
+)
 trace.set_tracer_provider(tracer_provider)
 tracer = trace.get_tracer(SERVICE_NAME)
 
@@ -63,42 +94,98 @@ deliveries_counter = meter.create_counter(
 HTTPXClientInstrumentor().instrument()
 
 # ─── In-Memory Store ───────────────────────────────────────────────────────────
-deliveries: dict[str, dict] = {}
+# Bounded so continuous simulator traffic can't grow memory without limit;
+# the least recently used deliveries are evicted first.
+deliveries: LRUCache[str, dict] = LRUCache(maxsize=int(os.getenv("MAX_DELIVERIES", "100000")))
 
 NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:3002")
 DRIVERS = ["Alice", "Bob", "Carlos", "Diana", "Eve"]
 
+# Dedicated generator for the simulation so the hot path uses bound methods on
+# one instance instead of module-level lookups on the shared global RNG.
+_rng = random.Random()
+
 
 def fake_gps():
     """Generate a random GPS coordinate near Paris."""
+    u1, u2 = _rng.random(), _rng.random()
     return {
-        "lat": round(48.8566 + random.uniform(-0.05, 0.05), 6),
-        "lng": round(2.3522 + random.uniform(-0.05, 0.05), 6),
+        "lat": round(48.8566 + (u1 - 0.5) * 0.1, 6),
+        "lng": round(2.3522 + (u2 - 0.5) * 0.1, 6),
     }
 
 
+# ─── Notifications ─────────────────────────────────────────────────────────────
+# Notifications are sent off the delivery's critical path. The semaphore bounds
+# how many can be in flight, applying backpressure to the consumer if the
+# Notification Service falls behind.
+_notification_tasks: set[asyncio.Task] = set()
+_notification_slots = asyncio.Semaphore(int(os.getenv("MAX_PENDING_NOTIFICATIONS", "100")))
+
+NOTIFY_URL = f"{NOTIFICATION_SERVICE_URL}/notify"
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_MSG_TMPL = "Your order is on its way! Driver {} will deliver in ~{} minutes.".format
+
+
+def _notification_done(task: asyncio.Task):
+    _notification_tasks.discard(task)
+    _notification_slots.release()
+
+
+async def _notify(order_id: str, delivery_id: str, driver: str, estimated_minutes: int):
+    # delivery.assign has usually ended by the time this runs, so the POST gets
+    # its own child span to carry the outcome into Jaeger.
+    with tracer.start_as_current_span("delivery.notify") as span:
+        span.set_attributes({"order.id": order_id, "delivery.id": delivery_id})
+        try:
+            payload = {
+                "order_id": order_id,
+                "delivery_id": delivery_id,
+                "driver": driver,
+                "message": _MSG_TMPL(driver, estimated_minutes),
+            }
+            # Serialise with orjson rather than httpx's stdlib json encoder
+            resp = await app.state.http.post(
+                NOTIFY_URL,
+                content=orjson.dumps(payload),
+                headers=_JSON_HEADERS,
+            )
+            resp.raise_for_status()
+        except Exception as exc:
+            span.record_exception(exc)
+            span.set_status(trace.StatusCode.ERROR, str(exc))
+            logger.warning(
+                "Failed to send notification",
+                extra={"order_id": order_id, "error": str(exc)},
+            )
+        else:
+            span.set_status(trace.StatusCode.OK)
+
+
 # ─── Core Business Logic ───────────────────────────────────────────────────────
 # This function is called from BOTH the RabbitMQ consumer and (optionally) the
 # HTTP endpoint below, keeping the logic DRY.
 async def process_delivery(order_id: str, restaurant: str) -> dict:
     """Assign a driver and notify the customer. Called from the AMQP consumer."""
-    driver = random.choice(DRIVERS)
-    delivery_id = str(uuid.uuid4())[:8]
+    driver = _rng.choice(DRIVERS)
+    delivery_id = os.urandom(4).hex()
 
     with tracer.start_as_current_span("delivery.assign") as span:
-        span.set_attribute("delivery.id", delivery_id)
-        span.set_attribute("delivery.driver", driver)
-        span.set_attribute("order.id", order_id)
-        span.set_attribute("delivery.pickup_restaurant", restaurant)
+        span.set_attributes({
+            "delivery.id": delivery_id,
+            "delivery.driver": driver,
+            "order.id": order_id,
+            "delivery.pickup_restaurant": restaurant,
+        })
 
         pickup_coords = fake_gps()
         dropoff_coords = fake_gps()
 
         # Simulate pickup delay
-        pickup_delay = random.uniform(0.5, 2.0)
-        time.sleep(pickup_delay)
+        pickup_delay = _rng.uniform(0.5, 2.0)
+        await asyncio.sleep(pickup_delay)
 
-        estimated_minutes = random.randint(10, 40)
+        estimated_minutes = _rng.randint(10, 40)
         delivery = {
             "id": delivery_id,
             "order_id": order_id,
@@ -110,7 +197,7 @@ async def process_delivery(order_id: str, restaurant: str) -> dict:
         }
         deliveries[delivery_id] = delivery
 
-        delivery_duration.record(random.uniform(10, 40), {"driver": driver})
+        delivery_duration.record(_rng.uniform(10, 40), {"driver": driver})
         deliveries_counter.add(1, {"driver": driver})
 
         logger.info(
@@ -118,28 +205,15 @@ async def process_delivery(order_id: str, restaurant: str) -> dict:
             extra={"delivery_id": delivery_id, "order_id": order_id, "driver": driver},
         )
 
-        # Notify customer (HTTP, synchronous)
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.post(
-                    f"{NOTIFICATION_SERVICE_URL}/notify",
-                    json={
-                        "order_id": order_id,
-                        "delivery_id": delivery_id,
-                        "driver": driver,
-                        "message": (
-                            f"Your order is on its way! Driver {driver} "
-                            f"will deliver in ~{estimated_minutes} minutes."
-                        ),
-                    },
-                )
-                resp.raise_for_status()
-        except Exception as exc:
-            span.record_exception(exc)
-            logger.warning(
-                "Failed to send notification",
-                extra={"order_id": order_id, "error": str(exc)},
-            )
+        # Notify customer (HTTP, in the background). The task inherits the
+        # current context, so its delivery.notify span is a child of this one.
+        await _notification_slots.acquire()
+        task = asyncio.create_task(
+            _notify(order_id, delivery_id, driver, estimated_minutes),
+            name=f"notify-{delivery_id}",
+        )
+        _notification_tasks.add(task)
+        task.add_done_callback(_notification_done)
 
         span.set_status(trace.StatusCode.OK)
         return delivery
@@ -151,6 +225,13 @@ async def process_delivery(order_id: str, restaurant: str) -> dict:
 async def lifespan(app: FastAPI):
     logger.info("Delivery service starting up")
 
+    # One pooled client for the process lifetime so notification calls reuse
+    # keep-alive connections instead of a new TCP handshake per delivery.
+    app.state.http = httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=50),
+    )
+
     # Start the RabbitMQ consumer as a background asyncio task
     consumer_task = asyncio.create_task(
         start_consumer(process_delivery, tracer),
@@ -165,17 +246,20 @@ async def lifespan(app: FastAPI):
         await consumer_task
     except asyncio.CancelledError:
         pass
+    # Let in-flight notifications finish before closing the shared client
+    await asyncio.gather(*_notification_tasks, return_exceptions=True)
+    await app.state.http.aclose()
     tracer_provider.shutdown()
     meter_provider.shutdown()
 
 
-app = FastAPI(title="Delivery Service", lifespan=lifespan)
+app = FastAPI(title="Delivery Service", lifespan=lifespan, default_response_class=ORJSONResponse)
 FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer_provider)
 Instrumentator().instrument(app).expose(app)
 
 
 @app.get("/health")
-async def health():
+def health():
     return {"status": "ok", "service": "delivery-service"}
 
 
@@ -1,12 +1,14 @@
+import asyncio
 import logging
 import os
 import random
-import time
-import uuid
 from contextlib import asynccontextmanager
 
 import httpx
+import orjson
+from cachetools import LRUCache
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from opentelemetry import trace
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
@@ -14,54 +16,91 @@ from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBasedTraceIdRatio
 from prometheus_fastapi_instrumentator import Instrumentator
-from pythonjsonlogger import jsonlogger
 
 from models import Order, OrderRequest, OrderStatus
 
 # ─── Logging ──────────────────────────────────────────────────────────────────
+# Attributes every LogRecord has; anything else on a record came from `extra=`.
+_LOG_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (timestamp, level, name, message + extras), encoded with orjson."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _LOG_RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
 logger = logging.getLogger("order-service")
 handler = logging.StreamHandler()
-handler.setFormatter(
-    jsonlogger.JsonFormatter(
-        fmt="%(asctime)s %(levelname)s %(name)s %(message)s",
-        rename_fields={"asctime": "timestamp", "levelname": "level"},
-    )
-)
+handler.setFormatter(JsonFormatter())
 logger.addHandler(handler)
 logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
 
 # ─── OpenTelemetry Setup ───────────────────────────────────────────────────────
 resource = Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "order-service")})
-tracer_provider = TracerProvider(resource=resource)
+# Orders start the trace, so this ratio decides which journeys are recorded
+# end-to-end; downstream services honour the propagated sampled flag.
+sampler = ParentBasedTraceIdRatio(float(os.getenv("OTEL_SAMPLER_RATIO", "0.1")))
+tracer_provider = TracerProvider(resource=resource, sampler=sampler)
 otlp_exporter = OTLPSpanExporter(
     endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4317"),
     insecure=True,
 )
-tracer_provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
+tracer_provider.add_span_processor(
+    BatchSpanProcessor(
+        otlp_exporter,
+        max_queue_size=2048,
+        max_export_batch_size=512,
+        schedule_delay_millis=5000,
+        export_timeout_millis=30000,
+    )
+)
 trace.set_tracer_provider(tracer_provider)
 tracer = trace.get_tracer("order-service")
 
 HTTPXClientInstrumentor().instrument()
 
 # ─── In-Memory Store ───────────────────────────────────────────────────────────
-orders: dict[str, Order] = {}
+orders: LRUCache[str, Order] = LRUCache(maxsize=int(os.getenv("MAX_ORDERS", "100000")))
 
 KITCHEN_SERVICE_URL = os.getenv("KITCHEN_SERVICE_URL", "http://localhost:3001")
 
 RESTAURANTS = ["Bella Napoli", "Sushi Garden", "Burger Palace", "Taco Fiesta"]
 ITEMS_POOL = ["Margherita", "Salmon Roll", "Double Bacon", "Burrito", "Tiramisu", "Miso Soup"]
 
+_rng = random.Random()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Order service starting up")
+    # One pooled client for the process lifetime so kitchen calls reuse
+    # keep-alive connections instead of a new TCP handshake per order.
+    app.state.http = httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=50),
+    )
     yield
     logger.info("Order service shutting down")
+    await app.state.http.aclose()
     tracer_provider.shutdown()
 
 
-app = FastAPI(title="Order Service", lifespan=lifespan)
+app = FastAPI(title="Order Service", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 FastAPIInstrumentor.instrument_app(app, tracer_provider=tracer_provider)
 Instrumentator().instrument(app).expose(app)
@@ -70,18 +109,20 @@ Instrumentator().instrument(app).expose(app)
 # ─── Routes ────────────────────────────────────────────────────────────────────
 
 @app.get("/health")
-async def health():
+def health():
     return {"status": "ok", "service": "order-service"}
 
 
 @app.post("/orders", response_model=Order, status_code=201)
 async def create_order(request: OrderRequest):
-    order_id = str(uuid.uuid4())[:8]
+    order_id = os.urandom(4).hex()
 
     with tracer.start_as_current_span("order.create") as span:
-        span.set_attribute("order.id", order_id)
-        span.set_attribute("order.restaurant", request.restaurant)
-        span.set_attribute("order.items_count", len(request.items))
+        span.set_attributes({
+            "order.id": order_id,
+            "order.restaurant": request.restaurant,
+            "order.items_count": len(request.items),
+        })
 
         order = Order(
             id=order_id,
@@ -98,16 +139,15 @@ async def create_order(request: OrderRequest):
         )
 
         # Simulate brief processing delay
-        time.sleep(random.uniform(0.05, 0.3))
+        await asyncio.sleep(_rng.uniform(0.05, 0.3))
 
         # Forward to kitchen (fire-and-forget style using background task)
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                payload = {"order_id": order_id, "restaurant": request.restaurant, "items": request.items}
-                resp = await client.post(f"{KITCHEN_SERVICE_URL}/prepare", json=payload)
-                resp.raise_for_status()
-                order.status = OrderStatus.PREPARING
-                logger.info("Order sent to kitchen", extra={"order_id": order_id})
+            payload = {"order_id": order_id, "restaurant": request.restaurant, "items": request.items}
+            resp = await app.state.http.post(f"{KITCHEN_SERVICE_URL}/prepare", json=payload)
+            resp.raise_for_status()
+            order.status = OrderStatus.PREPARING
+            logger.info("Order sent to kitchen", extra={"order_id": order_id})
         except Exception as exc:
             order.status = OrderStatus.FAILED
             span.record_exception(exc)
@@ -4,19 +4,24 @@ Traffic simulator for the Food Delivery Tracker.
 Sends a continuous stream of orders to the Order Service.
 
 Usage:
-    python simulate.py              # default: 1 order every 2 seconds
-    python simulate.py --rate 0.5   # 1 order every 0.5 seconds (faster)
-    python simulate.py --count 20   # send exactly 20 orders then exit
+    python simulate.py                  # default: 1 order every 2 seconds
+    python simulate.py --rate 0.5       # 1 order every 0.5 seconds (faster)
+    python simulate.py --count 20       # send exactly 20 orders then exit
+    python simulate.py --rate 0 --concurrency 50   # as fast as 50 in-flight requests allow
 """
 
 import argparse
+import asyncio
 import random
-import time
-import urllib.request
-import urllib.error
-import json
 import sys
 
+import httpx
+
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
+
 ORDER_SERVICE_URL = "http://localhost:8000"
 
 RESTAURANTS = ["Bella Napoli", "Sushi Garden", "Burger Palace", "Taco Fiesta", "La Boulangerie"]
@@ -37,51 +42,74 @@ def create_order() -> dict:
     return {"restaurant": restaurant, "items": items, "customer": customer}
 
 
-def post_order(payload: dict) -> dict | None:
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        f"{ORDER_SERVICE_URL}/orders",
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
+async def post_order(client: httpx.AsyncClient, payload: dict) -> dict | None:
     try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            return json.loads(resp.read())
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="replace")
-        print(f"  [HTTP {e.code}] {body[:120]}", flush=True)
+        resp = await client.post(f"{ORDER_SERVICE_URL}/orders", json=payload)
+        resp.raise_for_status()
+        return resp.json()
+    except httpx.HTTPStatusError as e:
+        print(f"  [HTTP {e.response.status_code}] {e.response.text[:120]}", flush=True)
         return None
     except Exception as e:
         print(f"  [ERROR] {e}", flush=True)
         return None
 
 
+async def send_order(client: httpx.AsyncClient, slots: asyncio.Semaphore, payload: dict):
+    try:
+        result = await post_order(client, payload)
+        if result:
+            print(f"  ✓ Order {result.get('id')} — status: {result.get('status')}", flush=True)
+    finally:
+        slots.release()
+
+
+async def run(args, stats: dict):
+    # Orders are issued every `rate` seconds without waiting for the previous
+    # response; `slots` caps how many requests are in flight at once.
+    slots = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    pending: set[asyncio.Task] = set()
+
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        while True:
+            await slots.acquire()
+            order = create_order()
+            print(f"→ [{stats['sent'] + 1}] Ordering {order['items']} from {order['restaurant']} for {order['customer']}...", flush=True)
+            task = asyncio.create_task(send_order(client, slots, order))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            stats["sent"] += 1
+            if args.count and stats["sent"] >= args.count:
+                await asyncio.gather(*pending)
+                print(f"\n✅ Done — {stats['sent']} orders sent.", flush=True)
+                break
+            await asyncio.sleep(args.rate)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main():
     parser = argparse.ArgumentParser(description="Food Delivery Traffic Simulator")
     parser.add_argument("--rate", type=float, default=2.0, help="Seconds between orders (default: 2)")
     parser.add_argument("--count", type=int, default=0, help="Number of orders to send (0 = infinite)")
+    parser.add_argument("--concurrency", type=positive_int, default=10, help="Max in-flight requests (default: 10)")
     args = parser.parse_args()
 
-    print(f"🚀 Simulator starting — 1 order every {args.rate}s", flush=True)
+    print(f"🚀 Simulator starting — 1 order every {args.rate}s, up to {args.concurrency} in flight", flush=True)
     if args.count:
         print(f"   Will send {args.count} orders then exit.", flush=True)
 
-    sent = 0
+    stats = {"sent": 0}
     try:
-        while True:
-            order = create_order()
-            print(f"→ [{sent + 1}] Ordering {order['items']} from {order['restaurant']} for {order['customer']}...", flush=True)
-            result = post_order(order)
-            if result:
-                print(f"  ✓ Order {result.get('id')} — status: {result.get('status')}", flush=True)
-            sent += 1
-            if args.count and sent >= args.count:
-                print(f"\n✅ Done — {sent} orders sent.", flush=True)
-                break
-            time.sleep(args.rate)
+        (uvloop.run if uvloop else asyncio.run)(run(args, stats))
     except KeyboardInterrupt:
-        print(f"\n⏹  Simulator stopped — {sent} orders sent.", flush=True)
+        print(f"\n⏹  Simulator stopped — {stats['sent']} orders sent.", flush=True)
         sys.exit(0)
 
 